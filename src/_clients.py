@@ -0,0 +1,42 @@
+"""
+Clientes compartidos de la aplicación
+Carga las variables de entorno una sola vez y reutiliza el cliente de OpenAI
+"""
+
+import functools
+import os
+import httpx
+from openai import AsyncOpenAI
+
+# Pool de conexiones compartido por todas las llamadas a OpenAI
+MAX_CONNECTIONS = 20
+
+# Si el entorno ya define todas estas variables no hace falta leer el .env
+ENV_KEYS = ("OPENAI_API_KEY", "OPENWEATHER_API_KEY")
+
+
+@functools.cache
+def load_env() -> None:
+    """Carga el archivo .env en las variables de entorno (solo la primera vez)"""
+    if all(key in os.environ for key in ENV_KEYS):
+        return
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+@functools.cache
+def get_async_openai() -> AsyncOpenAI:
+    """Devuelve el cliente asíncrono de OpenAI compartido"""
+    load_env()
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+        ),
+    )
@@ -1,27 +1,112 @@
 #!/usr/bin/env python3
+import asyncio
+import functools
+import hashlib
 import os
-from dotenv import load_dotenv
 
-from openai import OpenAI
+import diskcache
+import numpy as np
+import orjson
 
-# Load environment variables
-load_dotenv()
+from _clients import get_async_openai
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Caché de respuestas compartida entre ejecuciones
+CACHE_DIR = os.path.expanduser("~/.cache/sysnetvision/chat")
+CACHE_SIZE_LIMIT = 50_000_000
+# Segundos que se reutiliza una respuesta antes de volver a pedirla
+CHAT_CACHE_TTL = 3600
 
+# Caché semántica: reutiliza la respuesta de una pregunta suficientemente parecida
+EMBEDDING_MODEL = "text-embedding-3-small"
+SIMILARITY_THRESHOLD = 0.95
+MAX_SEMANTIC_ENTRIES = 1000
+
+
+@functools.cache
+def get_cache() -> diskcache.Cache:
+    return diskcache.Cache(CACHE_DIR, size_limit=CACHE_SIZE_LIMIT)
+
+
+def messages_key(messages: list[dict]) -> str:
+    return hashlib.sha1(orjson.dumps(messages, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+async def embed(text: str) -> np.ndarray:
+    response = await get_async_openai().embeddings.create(
+        model=EMBEDDING_MODEL, input=text
+    )
+    embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+
+async def chat_completion(messages: list[dict], semantic: bool = False):
+    # La caché es opcional: si no se puede usar se sigue sin ella
+    try:
+        cache = get_cache()
+        key = messages_key(messages)
+        reply = cache.get(key)
+    except Exception:
+        cache = None
+        reply = None
+    if reply is not None:
+        yield reply
+        return
+
+    # La caché semántica es opcional: si falla se sigue sin ella
+    embedding = None
+    if semantic and cache is not None:
+        try:
+            # Solo se comparan preguntas hechas con el mismo contexto previo
+            index_key = ("semantic", messages_key(messages[:-1]))
+            embedding = await embed(messages[-1]["content"])
+            embeddings, replies = cache.get(
+                index_key, (np.empty((0, embedding.size), dtype=np.float32), [])
+            )
+        except Exception:
+            embedding = None
+        else:
+            if replies:
+                scores = embeddings @ embedding
+                best = int(scores.argmax())
+                if scores[best] >= SIMILARITY_THRESHOLD:
+                    yield replies[best]
+                    return
 
-def chat_completion(messages: list[dict]):
     try:
-        response = client.chat.completions.create(
+        stream = await get_async_openai().chat.completions.create(
             model="gpt-3.5-turbo",  # Modelo más económico
             messages=messages,  # Mensajes del usuario
             max_tokens=100,  # Tokens máximos
             temperature=0.7,  # Temperatura
+            stream=True,  # Entregar los tokens a medida que se generan
         )
-        return response.choices[0].message.content
+        tokens = []
+        async for chunk in stream:
+            if chunk.choices:
+                token = chunk.choices[0].delta.content or ""
+                tokens.append(token)
+                yield token
+        reply = "".join(tokens)
     except Exception as e:
-        return f"Error: {e}"
+        yield f"Error: {e}"
+        return
+
+    if cache is None:
+        return
+    try:
+        cache.set(key, reply, expire=CHAT_CACHE_TTL)
+        if embedding is not None:
+            cache.set(
+                index_key,
+                (
+                    np.vstack([embeddings, embedding])[-MAX_SEMANTIC_ENTRIES:],
+                    (replies + [reply])[-MAX_SEMANTIC_ENTRIES:],
+                ),
+                expire=CHAT_CACHE_TTL,
+            )
+    except Exception:
+        # La respuesta ya se entregó; no guardarla en caché no es un error
+        pass
 
 
 messages = list(
@@ -33,5 +118,13 @@ messages = list(
         {"role": "user", "content": "Hola como estas?."},
     ]
 )
+
+
+async def main():
+    async for token in chat_completion(messages):
+        print(token, end="", flush=True)
+    print()
+
+
 if __name__ == "__main__":
-    print(chat_completion(messages))
+    asyncio.run(main())
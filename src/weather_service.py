@@ -4,73 +4,293 @@ Servicio de integración con API del clima
 Utiliza OpenWeatherMap API para obtener datos meteorológicos
 """
 
+import asyncio
 import os
-import requests
-from typing import Dict
-from dotenv import load_dotenv
+import time
+import httpx
+import orjson
+import diskcache
+from typing import Dict, List, Tuple
 
-# Cargar variables de entorno
-load_dotenv()
+from _clients import load_env
+
+# Máximo de peticiones simultáneas para respetar los límites de OpenWeatherMap
+MAX_CONCURRENT_REQUESTS = 8
+
+# Tamaño del pool de conexiones keep-alive reutilizadas entre peticiones
+POOL_MAXSIZE = 20
+MAX_CONNECTIONS = 40
+
+# Reintentos ante errores transitorios de la API
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Tiempo de vida por defecto de la caché (en segundos)
+WEATHER_CACHE_TTL = 600
+FORECAST_CACHE_TTL = 1800
+
+# Caché en disco compartida entre ejecuciones del CLI
+CACHE_DIR = os.path.expanduser("~/.cache/sysnetvision/weather")
+CACHE_SIZE_LIMIT = 50_000_000
+# Las entradas caducadas se conservan este tiempo para poder revalidarlas
+CACHE_RETENTION = 24 * 3600
 
 
 class WeatherService:
     """Clase para manejar la integración con la API del clima"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        ttl: int = WEATHER_CACHE_TTL,
+        forecast_ttl: int = FORECAST_CACHE_TTL,
+        cache_dir: str = CACHE_DIR,
+    ):
+        """
+        Args:
+            ttl (int): Segundos que se reutiliza el clima actual en caché
+            forecast_ttl (int): Segundos que se reutiliza un pronóstico en caché
+            cache_dir (str): Directorio de la caché persistente en disco
+        """
+        load_env()
         self.api_key = os.getenv("OPENWEATHER_API_KEY")
-        self.base_url = "http://api.openweathermap.org/data/2.5"
-
         if not self.api_key:
             raise ValueError(
                 "OPENWEATHER_API_KEY no encontrada en las variables de entorno"
             )
 
-    def get_weather_by_city(self, city: str, country_code: str = None) -> Dict:
+        self.base_url = "https://api.openweathermap.org/data/2.5"
+        self._weather_url = f"{self.base_url}/weather"
+        self._forecast_url = f"{self.base_url}/forecast"
+        # Parámetros comunes a todas las peticiones, como tupla de pares
+        self._base_params = (
+            ("appid", self.api_key),
+            ("units", "metric"),  # Temperatura en Celsius
+            ("lang", "es"),  # Respuesta en español
+        )
+        # Las claves de caché incluyen unidades e idioma (no la API key) para
+        # no servir datos guardados con otra configuración
+        self._cache_scope = tuple(
+            param for param in self._base_params if param[0] != "appid"
+        )
+        self._client = None
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._ttl = ttl
+        self._forecast_ttl = forecast_ttl
+        # clave -> (datos, etag, last_modified, expira_en)
+        self._cache = diskcache.Cache(cache_dir, size_limit=CACHE_SIZE_LIMIT)
+
+    async def __aenter__(self):
+        self._get_client()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Crea el cliente HTTP/2 de forma perezosa y lo reutiliza"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=10.0,
+                limits=httpx.Limits(
+                    max_keepalive_connections=POOL_MAXSIZE,
+                    max_connections=MAX_CONNECTIONS,
+                ),
+                # Respuestas comprimidas; httpx las descomprime al leerlas
+                headers={"Accept-Encoding": "gzip"},
+            )
+        return self._client
+
+    async def aclose(self):
+        """Cierra el cliente HTTP si está abierto y la conexión a la caché"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._cache.close()
+
+    async def _get(self, url: str, params: tuple, headers: Dict = None) -> tuple:
         """
-        Obtiene el clima actual de una ciudad específica
+        Realiza un GET a la API reintentando los errores transitorios
+
+        Los códigos 429 y 5xx, los fallos de conexión y los timeouts se
+        reintentan hasta MAX_RETRIES veces con espera exponencial. El límite
+        de concurrencia se aplica a cada intento, no durante las esperas.
 
         Args:
-            city (str): Nombre de la ciudad
-            country_code (str, optional): Código del país (ej: 'ES', 'US')
+            url (str): URL del recurso de la API
+            params (tuple): Parámetros de la petición como pares (nombre, valor)
+            headers (Dict, optional): Cabeceras adicionales de la petición
 
         Returns:
-            Dict: Datos del clima o mensaje de error
+            tuple: Código de estado, cuerpo en bytes y cabeceras de la respuesta
+        """
+        client = self._get_client()
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with self._semaphore:
+                    response = await client.get(url, params=params, headers=headers)
+            except (httpx.NetworkError, httpx.TimeoutException):
+                if attempt == MAX_RETRIES:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    return response.status_code, response.content, response.headers
+
+            await asyncio.sleep(RETRY_BACKOFF * 2**attempt)
+
+    async def _request(
+        self, url: str, params: tuple, formatter, *args, entry: tuple = None
+    ) -> tuple:
         """
+        Realiza una petición a la API y formatea la respuesta
+
+        Si se recibe una entrada caducada de la caché, la petición es
+        condicional (If-None-Match / If-Modified-Since) y una respuesta 304
+        reutiliza sus datos sin volver a descargarlos.
+
+        Args:
+            url (str): URL del recurso de la API
+            params (tuple): Parámetros de la petición como pares (nombre, valor)
+            formatter: Función que formatea los datos recibidos
+            entry (tuple, optional): Entrada caducada de la caché
+
+        Returns:
+            tuple: Datos formateados o mensaje de error, ETag y Last-Modified
+        """
+        headers = {}
+        if entry is not None:
+            _, etag, last_modified, _ = entry
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
         try:
-            # Construir parámetros de búsqueda
-            if country_code:
-                query = f"{city},{country_code}"
+            status, body, response_headers = await self._get(url, params, headers)
+
+            if status == 304 and entry is not None:
+                return entry[0], entry[1], entry[2]
+            elif status == 200:
+                data = orjson.loads(body)
+                return (
+                    formatter(data, *args),
+                    response_headers.get("ETag"),
+                    response_headers.get("Last-Modified"),
+                )
             else:
-                query = city
-
-            # Parámetros de la API
-            params = {
-                "q": query,
-                "appid": self.api_key,
-                "units": "metric",  # Temperatura en Celsius
-                "lang": "es",  # Respuesta en español
-            }
+                return (
+                    {
+                        "error": True,
+                        "message": f"Error {status}: {body.decode(errors='replace')}",
+                    },
+                    None,
+                    None,
+                )
+
+        except httpx.HTTPError as e:
+            return (
+                {"error": True, "message": f"Error de conexión: {str(e)}"},
+                None,
+                None,
+            )
+        except Exception as e:
+            return {"error": True, "message": f"Error inesperado: {str(e)}"}, None, None
+
+    async def _fetch(
+        self,
+        url: str,
+        params: tuple,
+        key: tuple,
+        ttl: int,
+        formatter,
+        *args,
+    ) -> Dict:
+        """
+        Obtiene una consulta desde la caché o, si no está, desde la API
+
+        Las respuestas correctas se guardan en caché bajo `key` durante `ttl`
+        segundos; los errores nunca se guardan para que la siguiente llamada
+        vuelva a intentarlo. Al caducar, la entrada se revalida con la API.
+        Las llamadas simultáneas con la misma clave comparten una única
+        petición a la API.
+
+        Args:
+            url (str): URL del recurso de la API
+            params (tuple): Parámetros de la petición como pares (nombre, valor)
+            key (tuple): Clave de la consulta en la caché
+            ttl (int): Segundos que la respuesta se considera vigente
+            formatter: Función que formatea los datos recibidos
 
-            # Realizar petición a la API
-            response = requests.get(
-                f"{self.base_url}/weather", params=params, timeout=10
+        Returns:
+            Dict: Datos formateados o mensaje de error
+        """
+        entry = self._cache.get(key)
+        if entry is not None and entry[3] > time.time():
+            return entry[0]
+
+        # Esperar a la petición en curso en lugar de repetirla. La petición
+        # corre en su propia tarea, así que cancelar a un llamador no la
+        # cancela para los demás
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._refresh(url, params, key, ttl, entry, formatter, *args)
             )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    async def _refresh(
+        self,
+        url: str,
+        params: tuple,
+        key: tuple,
+        ttl: int,
+        entry: tuple,
+        formatter,
+        *args,
+    ) -> Dict:
+        """Consulta la API y guarda en caché la respuesta si es correcta"""
+        result, etag, last_modified = await self._request(
+            url, params, formatter, *args, entry=entry
+        )
+        if not result["error"]:
+            self._cache.set(
+                key,
+                (result, etag, last_modified, time.time() + ttl),
+                expire=max(ttl, CACHE_RETENTION),
+            )
+        return result
 
-            if response.status_code == 200:
-                data = response.json()
-                return self._format_weather_data(data)
-            else:
-                return {
-                    "error": True,
-                    "message": f"Error {response.status_code}: {response.text}",
-                }
+    async def get_weather_by_city(self, city: str, country_code: str = None) -> Dict:
+        """
+        Obtiene el clima actual de una ciudad específica
 
-        except requests.exceptions.RequestException as e:
-            return {"error": True, "message": f"Error de conexión: {str(e)}"}
-        except Exception as e:
-            return {"error": True, "message": f"Error inesperado: {str(e)}"}
+        Args:
+            city (str): Nombre de la ciudad
+            country_code (str, optional): Código del país (ej: 'ES', 'US')
 
-    def get_weather_by_coordinates(self, lat: float, lon: float) -> Dict:
+        Returns:
+            Dict: Datos del clima o mensaje de error
+        """
+        # Construir parámetros de búsqueda
+        if country_code:
+            query = f"{city},{country_code}"
+        else:
+            query = city
+
+        params = self._base_params + (("q", query),)
+
+        key = ("weather", self._cache_scope, city.lower(), country_code)
+        return await self._fetch(
+            self._weather_url, params, key, self._ttl, self._format_weather_data
+        )
+
+    async def get_weather_by_coordinates(self, lat: float, lon: float) -> Dict:
         """
         Obtiene el clima actual por coordenadas geográficas
 
@@ -81,34 +301,14 @@ class WeatherService:
         Returns:
             Dict: Datos del clima o mensaje de error
         """
-        try:
-            params = {
-                "lat": lat,
-                "lon": lon,
-                "appid": self.api_key,
-                "units": "metric",
-                "lang": "es",
-            }
-
-            response = requests.get(
-                f"{self.base_url}/weather", params=params, timeout=10
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                return self._format_weather_data(data)
-            else:
-                return {
-                    "error": True,
-                    "message": f"Error {response.status_code}: {response.text}",
-                }
+        params = self._base_params + (("lat", lat), ("lon", lon))
 
-        except requests.exceptions.RequestException as e:
-            return {"error": True, "message": f"Error de conexión: {str(e)}"}
-        except Exception as e:
-            return {"error": True, "message": f"Error inesperado: {str(e)}"}
+        key = ("coord", self._cache_scope, round(lat, 2), round(lon, 2))
+        return await self._fetch(
+            self._weather_url, params, key, self._ttl, self._format_weather_data
+        )
 
-    def get_forecast(self, city: str, days: int = 5) -> Dict:
+    async def get_forecast(self, city: str, days: int = 5) -> Dict:
         """
         Obtiene el pronóstico del clima para varios días
 
@@ -119,32 +319,88 @@ class WeatherService:
         Returns:
             Dict: Pronóstico del clima o mensaje de error
         """
-        try:
-            params = {
-                "q": city,
-                "appid": self.api_key,
-                "units": "metric",
-                "lang": "es",
-                "cnt": days * 8,  # 8 mediciones por día (cada 3 horas)
-            }
+        # 8 mediciones por día (cada 3 horas)
+        params = self._base_params + (("q", city), ("cnt", days * 8))
+
+        key = ("forecast", self._cache_scope, city.lower(), days)
+        return await self._fetch(
+            self._forecast_url,
+            params,
+            key,
+            self._forecast_ttl,
+            self._format_forecast_data,
+            days,
+        )
+
+    async def get_weather_for_cities(self, cities: List[str]) -> List[Dict]:
+        """
+        Obtiene el clima actual de varias ciudades en paralelo
 
-            response = requests.get(
-                f"{self.base_url}/forecast", params=params, timeout=10
-            )
+        Args:
+            cities (List[str]): Nombres de las ciudades
 
-            if response.status_code == 200:
-                data = response.json()
-                return self._format_forecast_data(data, days)
-            else:
-                return {
-                    "error": True,
-                    "message": f"Error {response.status_code}: {response.text}",
-                }
+        Returns:
+            List[Dict]: Datos del clima de cada ciudad, en el mismo orden
+        """
+        return await asyncio.gather(
+            *[self.get_weather_by_city(city) for city in cities]
+        )
 
-        except requests.exceptions.RequestException as e:
-            return {"error": True, "message": f"Error de conexión: {str(e)}"}
-        except Exception as e:
-            return {"error": True, "message": f"Error inesperado: {str(e)}"}
+    async def get_weather_bulk(self, points: List[Tuple[float, float]]) -> List:
+        """
+        Obtiene el clima actual de varias coordenadas en paralelo
+
+        Las peticiones comparten el cliente HTTP y el límite de concurrencia
+        del servicio. Un fallo en un punto no cancela el resto del lote.
+
+        Args:
+            points (List[Tuple[float, float]]): Pares (latitud, longitud)
+
+        Returns:
+            List: Datos del clima de cada punto (o la excepción producida),
+            en el mismo orden
+        """
+        return await asyncio.gather(
+            *[self.get_weather_by_coordinates(lat, lon) for lat, lon in points],
+            return_exceptions=True,
+        )
+
+    def get_weather_bulk_sync(self, cities: List) -> List[Dict]:
+        """
+        Obtiene el clima actual de varias ciudades en paralelo sin usar asyncio
+
+        Pensado para código síncrono: ejecuta las consultas en un bucle de
+        eventos propio, así que no debe llamarse desde una corrutina.
+
+        Args:
+            cities (List): Nombres de ciudad o tuplas (ciudad, código de país)
+
+        Returns:
+            List[Dict]: Datos del clima de cada ciudad, en el mismo orden
+        """
+
+        async def fetch_all():
+            # El cliente y el semáforo quedan ligados al bucle de eventos en el
+            # que se usaron, así que se crean de nuevo para este
+            self._client = None
+            self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+            try:
+                return await asyncio.gather(
+                    *[
+                        (
+                            self.get_weather_by_city(*city)
+                            if isinstance(city, tuple)
+                            else self.get_weather_by_city(city)
+                        )
+                        for city in cities
+                    ]
+                )
+            finally:
+                if self._client is not None:
+                    await self._client.aclose()
+                self._client = None
+
+        return asyncio.run(fetch_all())
 
     def _format_weather_data(self, data: Dict) -> Dict:
         """Formatea los datos del clima en un formato más legible"""
@@ -163,19 +419,26 @@ class WeatherService:
         }
 
     def _format_forecast_data(self, data: Dict, days: int) -> Dict:
-        """Formatea los datos del pronóstico"""
-        forecast_list = []
-
-        for item in data["list"][: days * 8 : 8]:  # Una medición por día
-            forecast_list.append(
-                {
-                    "fecha": item["dt_txt"],
-                    "temperatura": f"{item['main']['temp']:.1f}°C",
-                    "descripcion": item["weather"][0]["description"].title(),
-                    "humedad": f"{item['main']['humidity']}%",
-                    "velocidad_viento": f"{item['wind']['speed']} m/s",
-                }
-            )
+        """
+        Extrae una medición por día del pronóstico
+
+        Los valores se devuelven sin formatear (números); usar
+        `format_for_display` para obtener el texto con unidades.
+        """
+        items = data["list"]
+        days = min(days, (len(items) + 7) // 8)
+        forecast_list = [None] * days
+
+        for i in range(days):
+            item = items[i * 8]  # Una medición por día
+            main = item["main"]
+            forecast_list[i] = {
+                "fecha": item["dt_txt"],
+                "temperatura": main["temp"],
+                "descripcion": item["weather"][0]["description"],
+                "humedad": main["humidity"],
+                "velocidad_viento": item["wind"]["speed"],
+            }
 
         return {
             "error": False,
@@ -185,16 +448,46 @@ class WeatherService:
         }
 
 
-def main():
-    """Función de prueba para el servicio del clima"""
-    try:
-        weather = WeatherService()
+def format_for_display(forecast: Dict) -> Dict:
+    """
+    Convierte un pronóstico de `get_forecast` a texto legible con unidades
+
+    Args:
+        forecast (Dict): Pronóstico con valores numéricos
+
+    Returns:
+        Dict: Mismo pronóstico con cada valor formateado como texto
+    """
+    if forecast.get("error"):
+        return forecast
+
+    return {
+        **forecast,
+        "pronostico": [
+            {
+                "fecha": day["fecha"],
+                "temperatura": f"{day['temperatura']:.1f}°C",
+                "descripcion": day["descripcion"].title(),
+                "humedad": f"{day['humedad']}%",
+                "velocidad_viento": f"{day['velocidad_viento']} m/s",
+            }
+            for day in forecast["pronostico"]
+        ],
+    }
 
-        # Ejemplo de uso
-        print("=== Servicio del Clima ===")
 
-        # Obtener clima por ciudad
-        result = weather.get_weather_by_city("Madrid", "ES")
+async def main():
+    """Función de prueba para el servicio del clima"""
+    try:
+        async with WeatherService() as weather:
+            # Ejemplo de uso
+            print("=== Servicio del Clima ===")
+
+            # Obtener clima y pronóstico por ciudad
+            result, forecast = await asyncio.gather(
+                weather.get_weather_by_city("Madrid", "ES"),
+                weather.get_forecast("Madrid", 3),
+            )
 
         if not result.get("error"):
             print(f"\n🌤️  Clima en {result['ciudad']}, {result['pais']}")
@@ -208,6 +501,17 @@ def main():
         else:
             print(f"❌ Error: {result['message']}")
 
+        forecast = format_for_display(forecast)
+        if not forecast.get("error"):
+            print(f"\n📅 Pronóstico en {forecast['ciudad']}, {forecast['pais']}")
+            for day in forecast["pronostico"]:
+                print(
+                    f"  {day['fecha']}: {day['temperatura']}, {day['descripcion']}, "
+                    f"💧 {day['humedad']}, 🌬️  {day['velocidad_viento']}"
+                )
+        else:
+            print(f"❌ Error: {forecast['message']}")
+
     except ValueError as e:
         print(f"❌ Error de configuración: {e}")
     except Exception as e:
@@ -215,4 +519,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,84 +1,158 @@
-import json
-import os
-from openai import OpenAI
-import requests
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-messages = [
-    {
-        "role": "system",
-        "content": "Eres un asistente que entrega datos sobre el clima del mundo en tiempo real usando la funcion get_weather",
-    },
-    {"role": "user", "content": "¿Cual es el clima en Buenos Aires?"},
+import asyncio
+import functools
+import httpx
+import orjson
+
+from _clients import get_async_openai
+
+# Máximo de prompts procesados en simultáneo para no exceder los límites RPM/TPM
+MAX_CONCURRENT_PROMPTS = 4
+semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROMPTS)
+
+# Cliente HTTP/2 compartido por todas las llamadas a open-meteo
+http_client = None
+
+system_message = {
+    "role": "system",
+    "content": "Eres un asistente que entrega datos sobre el clima del mundo en tiempo real usando la funcion get_weather",
+}
+prompts = [
+    "¿Cual es el clima en Buenos Aires?",
 ]
-functions = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_weather",
-            "description": "Usa esta funcion para obtener informacion sobre el clima",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "latitude": {
-                        "type": "number",
-                        "description": "Latitud de la ubicacion",
-                    },
-                    "longitude": {
-                        "type": "number",
-                        "description": "longitud de la ubicacion",
+
+
+@functools.cache
+def get_functions() -> list[dict]:
+    # Se construye una sola vez y se reutiliza el mismo objeto en cada petición
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "get_weather",
+                "description": "Usa esta funcion para obtener informacion sobre el clima",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "latitude": {
+                            "type": "number",
+                            "description": "Latitud de la ubicacion",
+                        },
+                        "longitude": {
+                            "type": "number",
+                            "description": "longitud de la ubicacion",
+                        },
                     },
+                    "required": ["latitude", "longitude"],
+                },
+                "output": {
+                    "type": "string",
+                    "description": "clima de la ubicacion pedida por el usuario",
                 },
-                "required": ["latitude", "longitude"],
-            },
-            "output": {
-                "type": "string",
-                "description": "clima de la ubicacion pedida por el usuario",
             },
-        },
-    }
-]
+        }
+    ]
+
 
+def get_http_client() -> httpx.AsyncClient:
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(http2=True, timeout=10.0)
+    return http_client
 
-def get_weather(latitude: float, longitude: float) -> str:
-    url = f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current_weather=true"
-    response = requests.get(url)
-    weather_data = response.json()
-    return json.dumps(weather_data)
 
+async def get_weather_bulk(points: list[tuple[float, float]]) -> list[str]:
+    # open-meteo acepta varias coordenadas separadas por comas en una sola petición
+    url = "https://api.open-meteo.com/v1/forecast"
+    params = {
+        "latitude": ",".join(str(latitude) for latitude, _ in points),
+        "longitude": ",".join(str(longitude) for _, longitude in points),
+        "current_weather": "true",
+    }
+    response = await get_http_client().get(url, params=params)
+    weather_data = orjson.loads(response.content)
+    # Con una sola ubicación (o un error) la respuesta es un objeto, no una lista
+    if not isinstance(weather_data, list):
+        weather_data = [weather_data] * len(points)
+    return [orjson.dumps(item).decode() for item in weather_data]
 
-response = client.chat.completions.create(
-    model="gpt-4o", messages=messages, tools=functions
-)
 
-assistant_message = response.choices[0].message
-print("respuesta del asistente")
-print(assistant_message)
+async def handle_prompt(prompt: str) -> str:
+    messages = [system_message, {"role": "user", "content": prompt}]
+    client = get_async_openai()
 
-if assistant_message.tool_calls:
-    for tool_call in assistant_message.tool_calls:
-        if tool_call.type == "function":
-            function_name = tool_call.function.name
-            function_args = json.loads(tool_call.function.arguments)
+    async with semaphore:
+        response = await client.chat.completions.create(
+            model="gpt-4o", messages=messages, tools=get_functions()
+        )
 
-            if function_name == "get_weather":
+        assistant_message = response.choices[0].message
+        print("respuesta del asistente")
+        print(assistant_message)
+
+        if not assistant_message.tool_calls:
+            # Sin llamadas a funciones la primera respuesta ya es la final
+            return assistant_message.content
+
+        messages.append(assistant_message)
+        weather_calls = []
+        for tool_call in assistant_message.tool_calls:
+            if (
+                tool_call.type == "function"
+                and tool_call.function.name == "get_weather"
+            ):
                 print("El asistente está llamando a la función get_weather")
-                weather_info = get_weather(
-                    latitude=function_args.get("latitude"),
-                    longitude=function_args.get("longitude"),
+                function_args = orjson.loads(tool_call.function.arguments)
+                latitude = function_args.get("latitude")
+                longitude = function_args.get("longitude")
+                weather_calls.append((tool_call, latitude, longitude))
+            else:
+                # Toda llamada necesita su respuesta o la API rechaza el mensaje
+                messages.append(
+                    {
+                        "role": "tool",
+                        "tool_call_id": tool_call.id,
+                        "content": "Error: herramienta no disponible",
+                    }
                 )
 
-                messages.append(assistant_message)
+        # Todas las ubicaciones pedidas se consultan en una única petición
+        if weather_calls:
+            weather_infos = await get_weather_bulk(
+                [(latitude, longitude) for _, latitude, longitude in weather_calls]
+            )
+            for (tool_call, _, _), weather_info in zip(weather_calls, weather_infos):
                 messages.append(
                     {
                         "role": "tool",
                         "tool_call_id": tool_call.id,
-                        "name": function_name,
+                        "name": tool_call.function.name,
                         "content": weather_info,
                     }
                 )
-second_response = client.chat.completions.create(model="gpt-4o", messages=messages)
-final_reply = second_response.choices[0].message.content
 
-print("Respuesta final del assistant")
-print(final_reply)
+        second_response = await client.chat.completions.create(
+            model="gpt-4o", messages=messages
+        )
+        return second_response.choices[0].message.content
+
+
+async def main():
+    try:
+        final_replies = await asyncio.gather(
+            *[handle_prompt(prompt) for prompt in prompts],
+            return_exceptions=True,  # Un prompt fallido no descarta los demás
+        )
+    finally:
+        if http_client is not None:
+            await http_client.aclose()
+
+    for prompt, final_reply in zip(prompts, final_replies):
+        if isinstance(final_reply, Exception):
+            print(f"❌ Error procesando '{prompt}': {final_reply}")
+            continue
+        print("Respuesta final del assistant")
+        print(final_reply)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())